@@ -0,0 +1,99 @@
+"""
+On-disk cache of final music agent states.
+
+Kept free of LangChain imports so the CLI can answer a repeated request without
+loading the agent at all.
+"""
+
+from pathlib import Path
+from datetime import datetime, timezone
+import hashlib
+import os
+import sys
+from typing import Any, Dict, Iterable, Optional
+import orjson
+
+# Model used by the agent. It is part of every cache key, so it lives here
+# rather than in ai_agent.
+MODEL_NAME = "gpt-4o-mini-2024-07-18"
+
+# Bump PROMPT_VERSION whenever the prompts or the state layout change.
+PROMPT_VERSION = "v1"
+
+CACHE_DIR = Path(__file__).parent / ".llm_cache"
+
+# States embed Spotify metadata (preview URLs etc.) that can change, and a state
+# stored while Spotify was unconfigured should eventually be retried, so entries
+# expire. ai_agent uses the same TTL for its Spotify search cache.
+CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+
+
+def cache_key(content: str) -> str:
+    """Return the sha256 key of ``content`` for the current model and prompt version.
+
+    Runs of whitespace are collapsed first, so re-scrapes that only differ in
+    line breaks or indentation share an entry.
+    """
+    normalized = " ".join(content.split())
+    return hashlib.sha256(f"{PROMPT_VERSION}|{MODEL_NAME}|{normalized}".encode("utf-8")).hexdigest()
+
+
+def _cache_path(content: str) -> Path:
+    return CACHE_DIR / f"{cache_key(content)}.json"
+
+
+def load_cached_state(
+    content: str,
+    required_keys: Iterable[str] = ("music_recommendations",),
+) -> Optional[Dict[str, Any]]:
+    """Return the cached final state for ``content``, or None on a miss or unreadable entry.
+
+    Entries older than CACHE_TTL count as a miss. They are stored without
+    ``page_content`` (see store_cached_state); it is restored from ``content``
+    so callers get back a complete state.
+    """
+    try:
+        entry = orjson.loads(_cache_path(content).read_bytes())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Warning: ignoring unreadable cache entry: {e}", file=sys.stderr)
+        return None
+    
+    if not isinstance(entry, dict):
+        return None
+    try:
+        created_at = datetime.fromisoformat(entry["created_at"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if (datetime.now(timezone.utc) - created_at).total_seconds() > CACHE_TTL:
+        return None
+    
+    state = entry.get("state")
+    if not isinstance(state, dict):
+        return None
+    state["page_content"] = content
+    if not set(required_keys) <= state.keys():
+        return None
+    return state
+
+
+def store_cached_state(content: str, state: Dict[str, Any]) -> None:
+    """Atomically write ``state`` to the cache so readers never see a partial file.
+
+    ``page_content`` is left out: it is the input the entry is keyed on, and
+    for long articles it would otherwise dominate the size (and parse time)
+    of every entry.
+    """
+    path = _cache_path(content)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    entry = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "state": {key: value for key, value in state.items() if key != "page_content"}
+    }
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_bytes(orjson.dumps(entry))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Warning: could not write cache entry: {e}", file=sys.stderr)
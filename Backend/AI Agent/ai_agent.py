@@ -1,13 +1,30 @@
 from pathlib import Path
-import json
+import asyncio
+import contextvars
+import difflib
+import functools
 import re
 import os
 import sys
-from typing import Optional, TypedDict, List, Dict, Any
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+import time
+import weakref
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional, TypedDict, List, Dict, Any, Callable, Tuple, Type
+import msgspec
+import orjson
+from agent_cache import CACHE_TTL, MODEL_NAME, PROMPT_VERSION, cache_key, load_cached_state, store_cached_state
+
+# LangChain, LangGraph and httpx are imported where they are first used so that
+# importing this module (e.g. for page_content) stays cheap. Environment
+# variables are read at call time; entry points are responsible for load_dotenv().
+# Entry points can check LAZY_DEPENDENCIES up front to report a missing install.
+LAZY_DEPENDENCIES = ("langchain_core", "langchain_openai", "langgraph", "httpx")
+
+if TYPE_CHECKING:
+    import httpx
+    from langchain_core.runnables import RunnableConfig
+    from langchain_openai import ChatOpenAI
+    from langgraph.types import StreamWriter
 
 
 # Directory containing scraped JSON files, resolved relative to this file
@@ -19,28 +36,48 @@ SCRAPED_DATA_DIR: Path = (
 FILENAME_REGEX = re.compile(r"^@?_\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}\.json$")
 
 
+@functools.cache
 def _find_latest_scraped_file(directory: Path) -> Optional[Path]:
     """Return the most recently modified scraped JSON file matching the pattern."""
     if not directory.exists():
         return None
 
-    candidates = [
-        path
-        for path in directory.iterdir()
-        if path.is_file() and FILENAME_REGEX.match(path.name)
-    ]
-
-    if not candidates:
-        return None
-
-    return max(candidates, key=lambda p: p.stat().st_mtime)
-
-
+    # scandir reuses the dirent data, so names are filtered before anything is
+    # stat'ed and only the newest match is kept instead of building a list
+    best: Optional[str] = None
+    best_mtime = -1.0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            name = entry.name
+            # Cheap prefilter before the regex for unrelated files
+            if len(name) < 25 or not name.endswith(".json") or not name.startswith(("@_", "_")):
+                continue
+            if not FILENAME_REGEX.match(name) or not entry.is_file():
+                continue
+            mtime = entry.stat().st_mtime
+            if mtime > best_mtime:
+                best_mtime, best = mtime, entry.path
+
+    return Path(best) if best else None
+
+
+@functools.cache
 def _read_content_from_json(file_path: Path) -> str:
     """Read the "content" field from the given JSON file, or empty string if missing."""
     try:
-        with file_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
+        import ijson
+    except ImportError:
+        ijson = None
+    
+    try:
+        with file_path.open("rb") as f:
+            if ijson is not None:
+                # Stream-parse so sibling fields (links, images, ...) are skipped
+                # without being materialized
+                for value in ijson.items(f, "content", use_float=True):
+                    return str(value)
+                return ""
+            data = orjson.loads(f.read())
         if isinstance(data, dict):
             return str(data.get("content", ""))
         return ""
@@ -48,54 +85,94 @@ def _read_content_from_json(file_path: Path) -> str:
         return ""
 
 
-# Public variable: the text content of the most recent scraped file
-_latest_file: Optional[Path] = _find_latest_scraped_file(SCRAPED_DATA_DIR)
-page_content: str = _read_content_from_json(_latest_file) if _latest_file else ""
+def _latest_page_content() -> str:
+    """Return the text content of the most recent scraped file (scanned once per process)."""
+    latest_file = _find_latest_scraped_file(SCRAPED_DATA_DIR)
+    return _read_content_from_json(latest_file) if latest_file else ""
+
+
+def __getattr__(name: str) -> Any:
+    # Public attribute ``page_content``: resolved lazily so importing the module
+    # doesn't touch the filesystem
+    if name == "page_content":
+        return _latest_page_content()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-from langchain_openai import ChatOpenAI
-from pydantic import BaseModel
-from langchain_core.messages import SystemMessage, HumanMessage
-from langgraph.graph import StateGraph, END
+# Latency grows with output length, so cap generation near what the fused schema
+# needs: analysis (~50 tokens) + tags (~120) + 3-5 recommendations (~500) + JSON keys
+MAX_OUTPUT_TOKENS = 800
 
-# Initialize LLM - use environment variable if available
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Initialize LLM (will be validated when first used)
-llm = None
-if OPENAI_API_KEY:
-    llm = ChatOpenAI(
-        model="gpt-4o", 
+@functools.lru_cache(maxsize=1)
+def _get_openai_http_client() -> "httpx.Client":
+    """Keep-alive client shared by all OpenAI calls, so the TLS handshake is paid once."""
+    import httpx
+    
+    options = dict(
+        timeout=httpx.Timeout(30.0, connect=5.0),
+        limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=60.0)
+    )
+    try:
+        # HTTP/2 lets concurrent calls multiplex on one connection
+        return httpx.Client(http2=True, **options)
+    except ImportError:
+        # HTTP/2 needs the optional h2 package (httpx[http2])
+        return httpx.Client(**options)
+
+
+@functools.lru_cache(maxsize=1)
+def get_llm() -> "ChatOpenAI":
+    """Create the chat model on first use."""
+    from langchain_openai import ChatOpenAI
+    
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        raise RuntimeError("OPENAI_API_KEY not found. Set it in the environment or in a .env file.")
+    
+    return ChatOpenAI(
+        model=MODEL_NAME, 
         temperature=0.3, 
-        api_key=OPENAI_API_KEY
+        max_tokens=MAX_OUTPUT_TOKENS,
+        api_key=openai_api_key,
+        streaming=True,
+        http_client=_get_openai_http_client()
     )
-else:
-    print("Warning: OPENAI_API_KEY not found. LLM operations will fail.", file=sys.stderr)
 
-# Pydantic models for structured output
-class AnalysisResult(BaseModel):
+
+# msgspec structs for structured output. forbid_unknown_fields also emits
+# "additionalProperties": false, which OpenAI's strict JSON schema mode requires.
+class AnalysisResult(msgspec.Struct, forbid_unknown_fields=True):
     theme: str
     mood: List[str]
 
-class TaggedResult(BaseModel):
+class TaggedResult(msgspec.Struct, forbid_unknown_fields=True):
     tags: List[str]
     embedding_description: str
 
-class MusicRecommendation(BaseModel):
+class MusicRecommendation(msgspec.Struct, forbid_unknown_fields=True):
     title: str
     artist: str
     match_reason: str
 
-class MusicRecommendations(BaseModel):
+class MusicRecommendations(msgspec.Struct, forbid_unknown_fields=True):
     recommendations: List[MusicRecommendation]
 
+class FullPipelineResult(msgspec.Struct, forbid_unknown_fields=True):
+    analysis: AnalysisResult
+    tagged: TaggedResult
+    recommendations: MusicRecommendations
+
 class AgentState(TypedDict):
     page_content: str
+    pipeline_result: Optional[Dict[str, Any]]
     analysis_result: Optional[Dict[str, Any]]
     tagged_result: Optional[Dict[str, Any]]
     music_recommendations: Optional[Dict[str, Any]]
 
-CONTENT_ANALYZER_PROMPT = """You are an AI assistant that analyzes written text and extracts its thematic and emotional characteristics for music matching.
+# The three steps below are sent to the model as one prompt (FULL_PIPELINE_PROMPT)
+# so the whole analysis -> tags -> recommendations chain costs a single call.
+CONTENT_ANALYZER_PROMPT = """Analyze the written text and extract its thematic and emotional characteristics for music matching.
 
 Follow these rules:
 - Always summarize the main theme in 2 to 5 words.
@@ -129,20 +206,12 @@ Output:
   "theme": "fantasy adventure",
   "mood": ["epic", "intense", "dramatic"]
 }}
-
----
-
-Now analyze the following input:
-
-{page_content}
-
 """
 
 
-EMBEDDING_TAGGING_PROMPT = """You are an AI assistant that converts thematic and emotional descriptors into compact tags and structured embeddings for music matching.
+EMBEDDING_TAGGING_PROMPT = """Convert the thematic and emotional descriptors into compact tags and structured embeddings for music matching.
 
-Input JSON:
-{analysis_result}
+Input JSON: the "analysis" object from step 1.
 
 Task:
 1. Extract the "theme" and "mood" fields.
@@ -176,10 +245,9 @@ Output:
 """
 
 
-MUSIC_SELECTOR_PROMPT = """You are an AI assistant that recommends music tracks or playlists based on thematic and emotional descriptors.
+MUSIC_SELECTOR_PROMPT = """Recommend music tracks or playlists based on the thematic and emotional descriptors.
 
-Input JSON:
-{tagged_result}
+Input JSON: the "tagged" object from step 2.
 
 Task:
 1. Interpret the "tags" and "embedding_description".
@@ -233,130 +301,461 @@ Output:
 """
 
 
+FULL_PIPELINE_PROMPT = (
+    """You are an AI assistant that turns written text into music recommendations.
+
+Complete all three steps below in a single pass and return one JSON object with the keys "analysis" (step 1), "tagged" (step 2) and "recommendations" (step 3).
+
+## Step 1: analysis
+
+"""
+    + CONTENT_ANALYZER_PROMPT
+    + """
+## Step 2: tagged
+
+"""
+    + EMBEDDING_TAGGING_PROMPT
+    + """
+## Step 3: recommendations
+
+"""
+    + MUSIC_SELECTOR_PROMPT
+    + """
+---
+
+Now analyze the following input:
+
+{page_content}
+"""
+)
+
+
+def _split_prompt(template: str, field: str) -> Tuple[str, str]:
+    """Split a one-field ``str.format`` template into (prefix, suffix) for plain concatenation."""
+    parts = template.split("{" + field + "}")
+    if len(parts) != 2:
+        raise ValueError(f"Prompt template must contain {{{field}}} exactly once")
+    # .format() is no longer involved, so collapse the doubled braces once here
+    prefix, suffix = (part.replace("{{", "{").replace("}}", "}") for part in parts)
+    return prefix, suffix
+
+
+_PIPELINE_PROMPT_PREFIX, _PIPELINE_PROMPT_SUFFIX = _split_prompt(FULL_PIPELINE_PROMPT, "page_content")
+
+
 # Spotify API integration
-try:
-    import spotipy
-    from spotipy.oauth2 import SpotifyClientCredentials
-    
-    SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
-    SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
-    
-    if SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET:
-        client_credentials_manager = SpotifyClientCredentials(
-            client_id=SPOTIFY_CLIENT_ID,
-            client_secret=SPOTIFY_CLIENT_SECRET
-        )
-        spotify = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
-    else:
-        spotify = None
+# spotipy is synchronous and would block the event loop while the searches for
+# several recommendations run concurrently, so the Web API is called directly.
+SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
+SPOTIFY_SEARCH_URL = "https://api.spotify.com/v1/search"
+SPOTIFY_MAX_CONCURRENCY = 5
+
+
+@functools.lru_cache(maxsize=1)
+def _spotify_credentials() -> Optional[Tuple[str, str]]:
+    """Return (client_id, client_secret) from the environment, warning once if missing."""
+    client_id = os.getenv("SPOTIFY_CLIENT_ID")
+    client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
+    if not (client_id and client_secret):
         print("Warning: Spotify credentials not found. Music search will use AI recommendations only.", file=sys.stderr)
-except ImportError:
-    spotify = None
-    print("Warning: spotipy not installed. Install with: pip install spotipy", file=sys.stderr)
+        return None
+    return client_id, client_secret
+
+
+# Client-credentials bearer token shared by all searches: (access_token, expires_at)
+_spotify_token: Optional[Tuple[str, float]] = None
+
+
+class _SpotifyLoopState:
+    """asyncio primitives and connections are bound to one event loop, so keep one set per loop."""
+
+    def __init__(self) -> None:
+        self.semaphore = asyncio.Semaphore(SPOTIFY_MAX_CONCURRENCY)
+        self.token_lock = asyncio.Lock()
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        """Shared keep-alive client so TCP/TLS setup is paid once, not per search."""
+        if self._client is None:
+            import httpx
+            try:
+                self._client = httpx.AsyncClient(http2=True, timeout=10.0)
+            except ImportError:
+                # HTTP/2 needs the optional h2 package (httpx[http2])
+                self._client = httpx.AsyncClient(timeout=10.0)
+        return self._client
+
+
+_spotify_loop_states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _SpotifyLoopState]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _spotify_loop_state() -> _SpotifyLoopState:
+    loop = asyncio.get_running_loop()
+    state = _spotify_loop_states.get(loop)
+    if state is None:
+        state = _spotify_loop_states[loop] = _SpotifyLoopState()
+    return state
+
+
+async def close_spotify_client() -> None:
+    """Close the running loop's Spotify client, if one was opened."""
+    state = _spotify_loop_states.pop(asyncio.get_running_loop(), None)
+    if state is not None and state._client is not None:
+        await state._client.aclose()
+
+
+async def _get_spotify_token(client: "httpx.AsyncClient", credentials: Tuple[str, str]) -> str:
+    """Return a cached bearer token, fetching a new one when it is about to expire."""
+    global _spotify_token
+    async with _spotify_loop_state().token_lock:
+        if _spotify_token is None or _spotify_token[1] <= time.monotonic():
+            response = await client.post(
+                SPOTIFY_TOKEN_URL,
+                data={"grant_type": "client_credentials"},
+                auth=credentials
+            )
+            response.raise_for_status()
+            payload = response.json()
+            # Refresh a minute early so a token never expires mid-request
+            expires_at = time.monotonic() + payload.get("expires_in", 3600) - 60
+            _spotify_token = (payload["access_token"], expires_at)
+        return _spotify_token[0]
+
+
+# Search results are cached in memory (LRU) and, when diskcache is installed,
+# on disk so repeated recommendations are not looked up again across runs
+SPOTIFY_CACHE_SIZE = 2048
+SPOTIFY_CACHE_TTL = CACHE_TTL  # track metadata such as preview URLs can change
+_SPOTIFY_CACHE_DIR = Path(__file__).parent / ".spotify_cache"
+_PUNCTUATION_REGEX = re.compile(r"[^\w\s]")
+
+# (normalized query, limit) -> tracks, each stored as an immutable tuple of items
+_spotify_search_cache: "OrderedDict[Tuple[str, int], Tuple[Tuple[Tuple[str, Any], ...], ...]]" = OrderedDict()
+_spotify_disk_cache = None
+
+# Set by arun_music_agent for each run; failed searches are recorded in the list
+# so a result degraded by a Spotify outage isn't cached
+_spotify_search_errors: "contextvars.ContextVar[Optional[List[str]]]" = contextvars.ContextVar(
+    "spotify_search_errors", default=None
+)
+
+
+def _normalize_query(query: str) -> str:
+    """Lowercase and drop punctuation so "The Battle" and "the battle!" share a cache entry."""
+    return " ".join(_PUNCTUATION_REGEX.sub(" ", query.lower()).split())
 
 
-def search_spotify_tracks(query: str, limit: int = 5) -> List[Dict[str, Any]]:
+def _get_spotify_disk_cache():
+    """Return the persistent search cache, or None if diskcache is unavailable."""
+    global _spotify_disk_cache
+    if _spotify_disk_cache is None:
+        try:
+            import diskcache
+        except ImportError:
+            print("Warning: diskcache not installed. Spotify searches are cached in memory only.", file=sys.stderr)
+            _spotify_disk_cache = False
+        else:
+            try:
+                _spotify_disk_cache = diskcache.Cache(str(_SPOTIFY_CACHE_DIR))
+            except Exception as e:
+                _disable_spotify_disk_cache(e)
+    return _spotify_disk_cache or None
+
+
+def _disable_spotify_disk_cache(error: Exception) -> None:
+    """Fall back to the in-memory search cache for the rest of the process."""
+    global _spotify_disk_cache
+    if _spotify_disk_cache is not False:
+        print(f"Warning: Spotify disk cache unavailable ({error}). Searches are cached in memory only.", file=sys.stderr)
+    _spotify_disk_cache = False
+
+
+def _remember_spotify_search(key: Tuple[str, int], tracks: Tuple[Tuple[Tuple[str, Any], ...], ...]) -> None:
+    _spotify_search_cache[key] = tracks
+    _spotify_search_cache.move_to_end(key)
+    if len(_spotify_search_cache) > SPOTIFY_CACHE_SIZE:
+        _spotify_search_cache.popitem(last=False)
+
+
+async def _search_spotify_uncached(query: str, limit: int, credentials: Tuple[str, str]) -> List[Dict[str, Any]]:
+    loop_state = _spotify_loop_state()
+    async with loop_state.semaphore:
+        client = loop_state.client
+        token = await _get_spotify_token(client, credentials)
+        response = await client.get(
+            SPOTIFY_SEARCH_URL,
+            params={"q": query, "type": "track", "limit": limit},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        response.raise_for_status()
+        results = response.json()
+    
+    tracks = []
+    for item in results['tracks']['items']:
+        tracks.append({
+            'title': item['name'],
+            'artist': ', '.join([artist['name'] for artist in item['artists']]),
+            'spotify_id': item['id'],
+            'spotify_url': item['external_urls']['spotify'],
+            'preview_url': item.get('preview_url'),
+            'album': item['album']['name']
+        })
+    return tracks
+
+
+async def search_spotify_tracks(query: str, limit: int = 5) -> List[Dict[str, Any]]:
     """Search for tracks on Spotify based on a query string."""
-    if not spotify:
+    credentials = _spotify_credentials()
+    if not credentials:
         return []
     
-    try:
-        results = spotify.search(q=query, type='track', limit=limit)
-        tracks = []
-        for item in results['tracks']['items']:
-            tracks.append({
-                'title': item['name'],
-                'artist': ', '.join([artist['name'] for artist in item['artists']]),
-                'spotify_id': item['id'],
-                'spotify_url': item['external_urls']['spotify'],
-                'preview_url': item.get('preview_url'),
-                'album': item['album']['name']
-            })
-        return tracks
-    except Exception as e:
-        print(f"Error searching Spotify: {e}", file=sys.stderr)
-        return []
+    key = (_normalize_query(query), limit)
+    cached = _spotify_search_cache.get(key)
+    if cached is None:
+        disk_cache = _get_spotify_disk_cache()
+        disk_key = f"{limit}|{key[0]}"
+        if disk_cache is not None:
+            try:
+                cached = disk_cache.get(disk_key)
+            except Exception as e:
+                # e.g. an unwritable directory or a SQLite lock held by another CLI
+                _disable_spotify_disk_cache(e)
+                disk_cache = None
+        
+        if cached is None:
+            try:
+                tracks = await _search_spotify_uncached(query, limit, credentials)
+            except Exception as e:
+                # Errors are not cached so the next run tries again
+                print(f"Error searching Spotify: {e}", file=sys.stderr)
+                errors = _spotify_search_errors.get()
+                if errors is not None:
+                    errors.append(str(e))
+                return []
+            cached = tuple(tuple(track.items()) for track in tracks)
+            if disk_cache is not None:
+                try:
+                    disk_cache.set(disk_key, cached, expire=SPOTIFY_CACHE_TTL)
+                except Exception as e:
+                    _disable_spotify_disk_cache(e)
+        
+        _remember_spotify_search(key, cached)
+    else:
+        _spotify_search_cache.move_to_end(key)
+    
+    # Hand out fresh dicts so callers can't mutate the cached entries
+    return [dict(track) for track in cached]
+
+
+# Recommendations sharing an artist are looked up with one artist:"..." search
+# and matched to the returned tracks by title similarity
+SPOTIFY_ARTIST_SEARCH_LIMIT = 20
+TITLE_MATCH_THRESHOLD = 0.7
+
+
+def _best_title_match(title: str, tracks: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Return the track whose title is most similar to ``title``, if above the threshold."""
+    best_track, best_ratio = None, TITLE_MATCH_THRESHOLD
+    title = title.lower()
+    for track in tracks:
+        ratio = difflib.SequenceMatcher(None, title, track['title'].lower()).ratio()
+        if ratio > best_ratio:
+            best_track, best_ratio = track, ratio
+    return best_track
+
+
+async def _match_recommendations_on_spotify(
+    recommendations: List[MusicRecommendation],
+) -> List[Optional[Dict[str, Any]]]:
+    """Return the Spotify track found for each recommendation, or None where there is none."""
+    by_artist: Dict[str, List[int]] = {}
+    for i, rec in enumerate(recommendations):
+        artist = _normalize_query(rec.artist)
+        if artist and artist != "unknown":
+            by_artist.setdefault(artist, []).append(i)
+    
+    # A single track by an artist is found more precisely by title + artist
+    artist_groups = [indices for indices in by_artist.values() if len(indices) > 1]
+    grouped = {i for indices in artist_groups for i in indices}
+    singles = [i for i in range(len(recommendations)) if i not in grouped]
+    
+    def track_query(i: int) -> Any:
+        return search_spotify_tracks(f"{recommendations[i].title} {recommendations[i].artist}", limit=1)
+    
+    artist_results, single_results = await asyncio.gather(
+        asyncio.gather(*[
+            search_spotify_tracks(f'artist:"{recommendations[indices[0]].artist}"', limit=SPOTIFY_ARTIST_SEARCH_LIMIT)
+            for indices in artist_groups
+        ]),
+        asyncio.gather(*[track_query(i) for i in singles])
+    )
+    
+    matches: List[Optional[Dict[str, Any]]] = [None] * len(recommendations)
+    for i, tracks in zip(singles, single_results):
+        matches[i] = tracks[0] if tracks else None
+    
+    unmatched = []
+    for indices, tracks in zip(artist_groups, artist_results):
+        for i in indices:
+            matches[i] = _best_title_match(recommendations[i].title, tracks)
+            if matches[i] is None:
+                unmatched.append(i)
+    
+    # Titles missing from the artist's results still get a targeted search
+    if unmatched:
+        for i, tracks in zip(unmatched, await asyncio.gather(*[track_query(i) for i in unmatched])):
+            matches[i] = tracks[0] if tracks else None
+    
+    return matches
+
+
+@functools.lru_cache(maxsize=None)
+def _get_structured_llm(schema: Type[msgspec.Struct]) -> Tuple[Any, msgspec.json.Decoder]:
+    """Bind ``schema`` to the chat model once, together with a decoder for its output.
+
+    The JSON schema is generated from the struct and sent as a strict
+    ``response_format``; the reply is decoded straight into ``schema`` by msgspec,
+    skipping both ``json.loads`` and Pydantic validation.
+    """
+    (ref,), components = msgspec.json.schema_components([schema], ref_template="#/$defs/{name}")
+    # OpenAI requires an object at the root, not a $ref
+    json_schema = components.pop(ref["$ref"].rsplit("/", 1)[-1])
+    if components:
+        json_schema["$defs"] = components
+    
+    response_format = {
+        "type": "json_schema",
+        "json_schema": {"name": schema.__name__, "strict": True, "schema": json_schema}
+    }
+    return get_llm().bind(response_format=response_format), msgspec.json.Decoder(schema)
+
+
+def _stream_structured(
+    schema: Type[msgspec.Struct],
+    messages: List[Any],
+    on_partial: Optional[Callable[[Any], None]] = None,
+) -> msgspec.Struct:
+    """Stream a structured-output call and decode the complete reply into ``schema``.
+
+    ``on_partial`` is called with the partially parsed JSON (plain dicts and lists)
+    each time a chunk closes an object. Without it the call goes through
+    ``invoke``, which (unlike ``stream``) consults the LangChain LLM cache.
+    """
+    bound_llm, decoder = _get_structured_llm(schema)
+    if on_partial is None:
+        return decoder.decode(bound_llm.invoke(messages).content)
+    
+    from langchain_core.utils.json import parse_partial_json
+    
+    parts: List[str] = []
+    for chunk in bound_llm.stream(messages):
+        parts.append(chunk.content)
+        if "}" in chunk.content:
+            partial = parse_partial_json("".join(parts))
+            if partial is not None:
+                on_partial(partial)
+    return decoder.decode("".join(parts))
 
 
 # LangGraph node functions
-def content_analyzer_node(state: AgentState) -> Dict[str, Any]:
-    """Analyze the page content and extract theme and mood."""
+def content_analyzer_node(state: AgentState, config: "RunnableConfig", writer: "StreamWriter") -> Dict[str, Any]:
+    """Run the fused analysis/tagging/recommendation call and extract theme and mood."""
     content = state.get('page_content', '')
     if not content:
+        print("Node 'content_analyzer' completed", file=sys.stderr)
         return {"analysis_result": {"theme": "unknown", "mood": []}}
     
-    prompt = CONTENT_ANALYZER_PROMPT.format(page_content=content)
+    from langchain_core.messages import SystemMessage, HumanMessage
+    
+    prompt = _PIPELINE_PROMPT_PREFIX + content + _PIPELINE_PROMPT_SUFFIX
     
     messages = [
-        SystemMessage(content="You are a helpful assistant that analyzes text and returns JSON."),
+        SystemMessage(content="You are a helpful assistant that analyzes text, recommends music and returns JSON."),
         HumanMessage(content=prompt)
     ]
     
-    # Use structured output to get JSON response
-    result = llm.with_structured_output(AnalysisResult).invoke(messages)
+    # Stream the AI recommendations to the graph's custom stream as they complete.
+    # The last item of a partial list may still be generating, so hold it back.
+    emitted = 0
     
+    def emit_partial(partial: Any) -> None:
+        nonlocal emitted
+        recommendations = ((partial.get("recommendations") or {}) if isinstance(partial, dict) else {})
+        complete = (recommendations.get("recommendations") or [])[:-1]
+        if len(complete) <= emitted:
+            return
+        emitted = len(complete)
+        writer({
+            "music_recommendations": {
+                "recommendations": [
+                    {
+                        "title": rec.get("title"),
+                        "artist": rec.get("artist"),
+                        "match_reason": rec.get("match_reason"),
+                        "source": "ai_recommendation"
+                    }
+                    for rec in complete
+                ]
+            }
+        })
+    
+    # Only stream when a caller listens for partial output (see arun_music_agent)
+    stream_partials = config.get("configurable", {}).get("stream_partials", False)
+    result = _stream_structured(FullPipelineResult, messages, emit_partial if stream_partials else None)
+    
+    print("Node 'content_analyzer' completed", file=sys.stderr)
+    
+    # Stash the full result so the downstream nodes don't need LLM calls of their own
     return {
-        "analysis_result": {
-            "theme": result.theme,
-            "mood": result.mood
-        }
+        "pipeline_result": msgspec.to_builtins(result),
+        "analysis_result": msgspec.to_builtins(result.analysis)
     }
 
 
 def tag_node(state: AgentState) -> Dict[str, Any]:
-    """Convert analysis result into tags and embedding description."""
-    analysis = state.get('analysis_result')
-    if not analysis:
+    """Extract tags and embedding description from the fused pipeline result."""
+    pipeline_result = state.get('pipeline_result')
+    print("Node 'tag' completed", file=sys.stderr)
+    if not pipeline_result:
         return {"tagged_result": {"tags": [], "embedding_description": ""}}
     
-    # Convert analysis to JSON string for the prompt
-    analysis_json = json.dumps(analysis, indent=2)
-    prompt = EMBEDDING_TAGGING_PROMPT.format(analysis_result=analysis_json)
-    
-    messages = [
-        SystemMessage(content="You are a helpful assistant that converts analysis into tags and returns JSON."),
-        HumanMessage(content=prompt)
-    ]
-    
-    # Use structured output to get JSON response
-    result = llm.with_structured_output(TaggedResult).invoke(messages)
-    
-    return {
-        "tagged_result": {
-            "tags": result.tags,
-            "embedding_description": result.embedding_description
-        }
-    }
+    return {"tagged_result": pipeline_result["tagged"]}
 
 
-def music_selector_node(state: AgentState) -> Dict[str, Any]:
-    """Search for music recommendations based on tags and embedding description."""
+async def music_selector_node(state: AgentState) -> Dict[str, Any]:
+    """Enrich the AI recommendations from the fused pipeline result with Spotify tracks."""
     tagged = state.get('tagged_result')
     if not tagged:
+        print("Node 'music_selector' completed", file=sys.stderr)
         return {"music_recommendations": {"recommendations": []}}
     
-    # Convert tagged result to JSON string for the prompt
-    tagged_json = json.dumps(tagged, indent=2)
-    prompt = MUSIC_SELECTOR_PROMPT.format(tagged_result=tagged_json)
+    # The tag fallback search only depends on tagged_result, so start it now and
+    # let it run alongside the per-recommendation searches
+    fallback_search = None
+    if tagged.get('tags'):
+        tag_query = ' '.join(tagged['tags'][:3])  # Use first 3 tags
+        fallback_search = asyncio.create_task(search_spotify_tracks(tag_query, limit=5))
     
-    messages = [
-        SystemMessage(content="You are a helpful assistant that recommends music and returns JSON."),
-        HumanMessage(content=prompt)
-    ]
+    ai_recommendations = msgspec.convert(
+        (state.get('pipeline_result') or {}).get("recommendations", {"recommendations": []}),
+        MusicRecommendations
+    )
     
-    # Get AI recommendations
-    ai_recommendations = llm.with_structured_output(MusicRecommendations).invoke(messages)
+    try:
+        # Try to find actual Spotify tracks for the recommendations
+        spotify_matches = await _match_recommendations_on_spotify(ai_recommendations.recommendations)
+    except BaseException:
+        if fallback_search is not None:
+            fallback_search.cancel()
+        raise
     
-    # Try to find actual Spotify tracks for the recommendations
     recommendations = []
-    for rec in ai_recommendations.recommendations:
-        # Search Spotify using the title and artist
-        search_query = f"{rec.title} {rec.artist}"
-        spotify_results = search_spotify_tracks(search_query, limit=1)
-        
-        if spotify_results:
+    for rec, spotify_track in zip(ai_recommendations.recommendations, spotify_matches):
+        if spotify_track:
             # Use the Spotify result if found
-            spotify_track = spotify_results[0]
             recommendations.append({
                 "title": spotify_track['title'],
                 "artist": spotify_track['artist'],
@@ -376,28 +775,29 @@ def music_selector_node(state: AgentState) -> Dict[str, Any]:
                 "source": "ai_recommendation"
             })
     
-    # If no Spotify results, try searching with tags
-    if not any(r.get('source') == 'spotify' for r in recommendations) and tagged.get('tags'):
-        # Try searching with tags
-        tag_query = ' '.join(tagged['tags'][:3])  # Use first 3 tags
-        spotify_results = search_spotify_tracks(tag_query, limit=5)
-        
-        if spotify_results:
-            # Replace recommendations with Spotify results
-            recommendations = []
-            for track in spotify_results:
-                recommendations.append({
-                    "title": track['title'],
-                    "artist": track['artist'],
-                    "match_reason": f"Found on Spotify matching tags: {', '.join(tagged['tags'])}",
-                    "spotify_id": track.get('spotify_id'),
-                    "spotify_url": track.get('spotify_url'),
-                    "preview_url": track.get('preview_url'),
-                    "album": track.get('album'),
-                    "source": "spotify"
-                })
-
+    # If no Spotify results, use the tag search started above
+    if fallback_search is not None:
+        if any(r.get('source') == 'spotify' for r in recommendations):
+            fallback_search.cancel()
+        else:
+            spotify_results = await fallback_search
+            
+            if spotify_results:
+                # Replace recommendations with Spotify results
+                recommendations = []
+                for track in spotify_results:
+                    recommendations.append({
+                        "title": track['title'],
+                        "artist": track['artist'],
+                        "match_reason": f"Found on Spotify matching tags: {', '.join(tagged['tags'])}",
+                        "spotify_id": track.get('spotify_id'),
+                        "spotify_url": track.get('spotify_url'),
+                        "preview_url": track.get('preview_url'),
+                        "album": track.get('album'),
+                        "source": "spotify"
+                    })
     
+    print("Node 'music_selector' completed", file=sys.stderr)
     return {
         "music_recommendations": {
             "recommendations": recommendations
@@ -405,9 +805,132 @@ def music_selector_node(state: AgentState) -> Dict[str, Any]:
     }
 
 
+# Optional LangChain LLM cache for callers that run with use_cache=False. It is
+# intentionally not enabled by the CLI: the whitespace-normalized result cache is
+# checked first with a looser key, so an exact-prompt hit here would already have
+# been a result-cache hit. Needs langchain-community.
+DEFAULT_LLM_CACHE_DB = str(Path(__file__).parent / ".music_cache.db")
+
+
+def configure_llm_cache(database_path: Optional[str] = None) -> bool:
+    """Install a SQLite-backed LangChain LLM cache. Returns False if langchain-community is missing.
+
+    ``database_path`` defaults to $MUSIC_CACHE_DB, then DEFAULT_LLM_CACHE_DB.
+    """
+    if database_path is None:
+        database_path = os.getenv("MUSIC_CACHE_DB", DEFAULT_LLM_CACHE_DB)
+    try:
+        from langchain_community.cache import SQLiteCache
+    except ImportError:
+        print("Warning: langchain-community not installed. Install with: pip install langchain-community", file=sys.stderr)
+        return False
+    from langchain_core.globals import set_llm_cache
+    
+    set_llm_cache(SQLiteCache(database_path=database_path))
+    return True
+
+
+# Optional semantic cache: reuse the state of a near-duplicate input (e.g. a
+# re-scrape of the same article) found by embedding similarity. Enable with SEMANTIC_CACHE=1
+# (or the CLI's --semantic-cache flag).
+# SEMANTIC_CACHE_ENABLED overrides the environment when set to a bool.
+SEMANTIC_CACHE_ENABLED: Optional[bool] = None
+_SEMANTIC_CACHE_DIR = Path(__file__).parent / ".semantic_cache"
+EMBEDDING_MODEL_NAME = "text-embedding-3-small"
+# Chroma cosine distance is 1 - cosine similarity, so this reuses states with similarity > 0.95
+# Override with SEMANTIC_CACHE_MAX_DISTANCE to trade precision for hit rate.
+SEMANTIC_CACHE_MAX_DISTANCE = 0.05
+
+_semantic_collection = None
+_embeddings = None
+
+
+def _semantic_cache_enabled() -> bool:
+    if SEMANTIC_CACHE_ENABLED is not None:
+        return SEMANTIC_CACHE_ENABLED
+    return os.getenv("SEMANTIC_CACHE") == "1"
+
+
+def _get_semantic_collection():
+    """Return the persistent Chroma collection, or None if chromadb is unavailable."""
+    global _semantic_collection, SEMANTIC_CACHE_ENABLED
+    if _semantic_collection is None:
+        try:
+            import chromadb
+        except ImportError:
+            SEMANTIC_CACHE_ENABLED = False
+            print("Warning: chromadb not installed. Install with: pip install chromadb", file=sys.stderr)
+            return None
+        
+        client = chromadb.PersistentClient(path=str(_SEMANTIC_CACHE_DIR))
+        _semantic_collection = client.get_or_create_collection(
+            name=f"agent_states_{PROMPT_VERSION}",
+            metadata={"hnsw:space": "cosine"}
+        )
+    return _semantic_collection
+
+
+async def _embed_content(content: str) -> List[float]:
+    global _embeddings
+    if _embeddings is None:
+        from langchain_openai import OpenAIEmbeddings
+        _embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL_NAME, api_key=os.getenv("OPENAI_API_KEY"))
+    return await _embeddings.aembed_query(content)
+
+
+def _semantic_lookup(embedding: List[float]) -> Optional[Dict[str, Any]]:
+    """Return the cached state of the nearest stored input if it is close enough."""
+    collection = _get_semantic_collection()
+    if collection is None or collection.count() == 0:
+        return None
+    
+    results = collection.query(
+        query_embeddings=[embedding],
+        n_results=1,
+        where={"model": MODEL_NAME}
+    )
+    max_distance = float(os.getenv("SEMANTIC_CACHE_MAX_DISTANCE", SEMANTIC_CACHE_MAX_DISTANCE))
+    if not results["ids"][0] or results["distances"][0][0] >= max_distance:
+        return None
+    return orjson.loads(results["documents"][0][0])
+
+
+def _semantic_store(content: str, embedding: List[float], state: Dict[str, Any]) -> None:
+    collection = _get_semantic_collection()
+    if collection is None:
+        return
+    
+    collection.upsert(
+        ids=[cache_key(content)],
+        embeddings=[embedding],
+        # page_content is the caller's input on a hit, so don't store the article
+        documents=[orjson.dumps({key: value for key, value in state.items() if key != "page_content"}).decode()],
+        metadatas=[{"model": MODEL_NAME}]
+    )
+
+
+# Routing: end the run early when a step produced nothing for the next one to use
+def _route_after_analysis(state: AgentState) -> str:
+    from langgraph.graph import END
+    
+    # The fused call already produced tags and recommendations, so keep them
+    # even when the theme came back as "unknown"
+    return "tag" if state.get("pipeline_result") else END
+
+
+def _route_after_tagging(state: AgentState) -> str:
+    from langgraph.graph import END
+    
+    tagged = state.get("tagged_result") or {}
+    recommendations = ((state.get("pipeline_result") or {}).get("recommendations") or {}).get("recommendations")
+    return "music_selector" if tagged.get("tags") or recommendations else END
+
+
 # Build the LangGraph workflow
 def build_music_agent_graph():
     """Build and return the compiled LangGraph workflow."""
+    from langgraph.graph import StateGraph, END
+    
     builder = StateGraph(AgentState)
     
     # Add nodes
@@ -419,8 +942,8 @@ def build_music_agent_graph():
     builder.set_entry_point("content_analyzer")
     
     # Add edges
-    builder.add_edge("content_analyzer", "tag")
-    builder.add_edge("tag", "music_selector")
+    builder.add_conditional_edges("content_analyzer", _route_after_analysis, {"tag": "tag", END: END})
+    builder.add_conditional_edges("tag", _route_after_tagging, {"music_selector": "music_selector", END: END})
     builder.add_edge("music_selector", END)
     
     # Compile the graph
@@ -428,42 +951,131 @@ def build_music_agent_graph():
     return graph
 
 
-# Create the graph instance
-music_agent_graph = build_music_agent_graph()
+@functools.lru_cache(maxsize=1)
+def get_music_agent_graph():
+    """Return the graph instance, compiling it on first use."""
+    return build_music_agent_graph()
+
+
+def warm_up() -> None:
+    """Import LangChain/LangGraph, compile the graph and create the model ahead of the first run.
+
+    Best effort: lets an entry point overlap the expensive imports with other
+    work (e.g. reading its input). Any failure, such as a missing API key, is
+    left for the run itself to report.
+    """
+    try:
+        get_music_agent_graph()
+        get_llm()
+    except Exception:
+        pass
 
 
-def run_music_agent(content: Optional[str] = None) -> Dict[str, Any]:
+async def arun_music_agent(
+    content: Optional[str] = None,
+    on_partial: Optional[Callable[[Dict[str, Any]], None]] = None,
+    use_cache: bool = True,
+) -> Dict[str, Any]:
     """
     Run the music agent workflow with the given content or page_content.
     
     Args:
         content: Optional content to analyze. If None, uses page_content.
+        on_partial: Optional callback receiving partial ``music_recommendations``
+            dicts as the LLM output streams in.
+        use_cache: Whether to read and write the on-disk result cache.
     
     Returns:
         Final state with all results including music recommendations.
     """
-    input_content = content if content is not None else page_content
+    input_content = content if content is not None else _latest_page_content()
     
     if not input_content:
         return {
             "error": "No content provided. Please provide content or ensure page_content is set."
         }
     
+    if use_cache:
+        cached_state = load_cached_state(input_content, AgentState.__required_keys__)
+        if cached_state is not None:
+            print("Loaded result from cache", file=sys.stderr)
+            return cached_state
+    
+    # The embedding call is far cheaper than the chat completion it may save
+    embedding = None
+    if use_cache and _semantic_cache_enabled():
+        try:
+            embedding = await _embed_content(input_content)
+            cached_state = _semantic_lookup(embedding)
+        except Exception as e:
+            print(f"Warning: semantic cache lookup failed: {e}", file=sys.stderr)
+            cached_state = None
+        if cached_state is not None:
+            print("Loaded result from semantic cache", file=sys.stderr)
+            cached_state["page_content"] = input_content
+            return cached_state
+    
     initial_state = {
         "page_content": input_content,
+        "pipeline_result": None,
         "analysis_result": None,
         "tagged_result": None,
         "music_recommendations": None
     }
     
-    # Run the graph and collect all states
-    final_state = initial_state.copy()
-    for node_outputs in music_agent_graph.stream(initial_state):
-        # Update final_state with outputs from each node
-        for node_name, node_state in node_outputs.items():
-            print(f"Node '{node_name}' completed", file=sys.stderr)
-            final_state.update(node_state)
+    # Collects Spotify search failures from this run (the graph's tasks share the list)
+    search_errors: List[str] = []
+    _spotify_search_errors.set(search_errors)
+    
+    # Run the graph in one shot; nodes report their own progress on stderr
+    music_agent_graph = get_music_agent_graph()
+    if on_partial is None:
+        final_state = await music_agent_graph.ainvoke(initial_state)
+    else:
+        # Streaming is only needed to forward the partial output nodes write
+        # through their StreamWriter; the last "values" chunk is the final state
+        final_state = initial_state
+        async for mode, chunk in music_agent_graph.astream(
+            initial_state,
+            config={"configurable": {"stream_partials": True}},
+            stream_mode=["values", "custom"]
+        ):
+            if mode == "values":
+                final_state = chunk
+            elif "music_recommendations" in chunk:
+                on_partial(chunk["music_recommendations"])
+    
+    music_recommendations = final_state.get("music_recommendations")
+    if use_cache and music_recommendations is not None:
+        if search_errors and not any(
+            rec.get("source") == "spotify" for rec in music_recommendations.get("recommendations", [])
+        ):
+            # Spotify failed rather than found nothing; let the next run retry it
+            print("Not caching result: Spotify searches failed", file=sys.stderr)
+            return final_state
+        store_cached_state(input_content, final_state)
+        if embedding is not None:
+            try:
+                _semantic_store(input_content, embedding, final_state)
+            except Exception as e:
+                print(f"Warning: could not update semantic cache: {e}", file=sys.stderr)
     
     return final_state
 
 
+def run_music_agent(
+    content: Optional[str] = None,
+    on_partial: Optional[Callable[[Dict[str, Any]], None]] = None,
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """Synchronous wrapper around :func:`arun_music_agent`."""
+    async def run() -> Dict[str, Any]:
+        try:
+            return await arun_music_agent(content, on_partial, use_cache)
+        finally:
+            # The loop is discarded after this call, so release its connections
+            await close_spotify_client()
+    
+    return asyncio.run(run())
+
+
@@ -72,5 +72,9 @@ def main():
             print(f"     Source: {rec.get('source', 'unknown')}")
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+    
+    # Load environment variables (OPENAI_API_KEY, Spotify credentials) from .env
+    load_dotenv()
     main()
 
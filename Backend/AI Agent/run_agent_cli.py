@@ -2,89 +2,395 @@
 """
 CLI entry point for the music agent.
 Takes content from stdin or command line argument and returns JSON recommendations.
+
+Heavy imports (ai_agent and LangChain, traceback) are deferred until they are
+needed, so --help, empty input and cache hits return quickly.
+
+With --batch it reads a JSON array of contents and writes a JSON array of
+results in the same order. With --serve the CLI becomes a long-running worker: it imports the agent once,
+then answers one newline-delimited JSON job ({"id", "content"}) per stdin line
+with one {"id", "music_recommendations"} line on stdout until stdin closes.
 """
 
+import os
 import sys
-import json
+import argparse
 import warnings
-import traceback
 
-# Suppress urllib3 OpenSSL warnings (compatibility issue with LibreSSL)
-warnings.filterwarnings("ignore", category=UserWarning, module="urllib3")
+try:
+    import orjson
+    
+    _loads = orjson.loads
+    
+    def _dumps(obj, indent):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+except ImportError:
+    # Fall back to the stdlib so errors (e.g. missing dependencies) are still reported as JSON
+    import json
+    
+    _loads = json.loads
+    
+    def _dumps(obj, indent):
+        return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False).encode("utf-8")
 
-# Suppress LangChain pydantic deprecation warnings (langchain-core internal usage)
-warnings.filterwarnings("ignore", message=".*langchain_core.pydantic_v1.*", category=DeprecationWarning)
 
-try:
-    from ai_agent import run_music_agent
-except ImportError as e:
-    error_result = {
-        "error": f"Failed to import ai_agent module: {str(e)}",
-        "music_recommendations": {"recommendations": []},
-        "hint": "Make sure all dependencies are installed: pip install -r requirements.txt"
-    }
-    print(json.dumps(error_result))
-    sys.exit(1)
-except Exception as e:
-    error_result = {
-        "error": f"Unexpected error during import: {str(e)}",
-        "music_recommendations": {"recommendations": []},
-        "traceback": traceback.format_exc()
+def _write(data):
+    """Write ``data`` (bytes) plus a newline straight to the stdout file descriptor.
+
+    os.write skips sys.stdout's buffering and locking; nothing else writes to
+    stdout, so no buffered output can be left behind it.
+    """
+    view = memoryview(data + b"\n")
+    while view:
+        # A pipe may accept fewer bytes than asked for
+        view = view[os.write(1, view):]
+
+
+def _emit(obj, indent=False):
+    """Write ``obj`` as one JSON document (plus newline) to stdout."""
+    _write(_dumps(obj, indent))
+
+
+# Every error envelope carries the same empty recommendations, serialized once
+_EMPTY_RECOMMENDATIONS = b'"music_recommendations":{"recommendations":[]}'
+
+
+def _err(message, **extra):
+    """Return the JSON error envelope for ``message`` (plus ``extra`` fields) as bytes."""
+    parts = [b'{"error":', _dumps(message, False), b",", _EMPTY_RECOMMENDATIONS]
+    for key, value in extra.items():
+        parts += [b",", _dumps(key, False), b":", _dumps(value, False)]
+    parts.append(b"}")
+    return b"".join(parts)
+
+
+def _traceback_fields():
+    """Return the current exception's traceback as an error field, if debugging is on.
+
+    Formatting walks every frame of what is often a deep LangChain stack, so it is
+    only done with --debug or MUSIC_AGENT_DEBUG set. Checks sys.argv directly
+    because import errors are reported before arguments are used.
+    """
+    if not (os.environ.get("MUSIC_AGENT_DEBUG") or "--debug" in sys.argv):
+        return {}
+    import traceback
+    
+    return {"traceback": traceback.format_exc()}
+
+
+def import_agent():
+    """Import the ai_agent module, or write a JSON error and return None if that fails."""
+    try:
+        from dotenv import load_dotenv
+        
+        # Load environment variables (OPENAI_API_KEY, Spotify credentials) from .env
+        load_dotenv()
+        import ai_agent
+        
+        # ai_agent imports LangChain and friends on first use, so a missing
+        # install would otherwise only surface mid-run without the hint below
+        import importlib.util
+        
+        for name in ai_agent.LAZY_DEPENDENCIES:
+            if importlib.util.find_spec(name) is None:
+                raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    except ImportError as e:
+        _write(_err(
+            f"Failed to import ai_agent module: {str(e)}",
+            hint="Make sure all dependencies are installed: pip install -r requirements.txt"
+        ))
+        return None
+    except Exception as e:
+        _write(_err(f"Unexpected error during import: {str(e)}", **_traceback_fields()))
+        return None
+    return ai_agent
+
+
+def setup_agent(args):
+    """Import the agent and apply the cache options from the command line (None if the import failed)."""
+    agent = import_agent()
+    if agent is None:
+        return None
+    if args.semantic_cache:
+        agent.SEMANTIC_CACHE_ENABLED = True
+    return agent
+
+
+def parse_args(argv=None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Get music recommendations for a piece of text.")
+    parser.add_argument(
+        "content",
+        nargs="?",
+        help="Content to analyze. Read from stdin when omitted."
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Write partial music_recommendations as JSON lines while the agent runs."
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore and do not update the on-disk result cache."
+    )
+    parser.add_argument(
+        "--semantic-cache",
+        action="store_true",
+        help="Also reuse results of near-duplicate content found by embedding similarity (needs chromadb)."
+    )
+    parser.add_argument(
+        "--pretty",
+        action="store_true",
+        help="Indent the final JSON output for reading (compact by default)."
+    )
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        help="Include tracebacks in error output (same as setting MUSIC_AGENT_DEBUG)."
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Read a JSON array of contents from stdin and write a JSON array of results."
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=4,
+        help="Maximum number of --batch items processed at once (default: 4)."
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run as a persistent worker answering newline-delimited JSON jobs from stdin."
+    )
+    return parser.parse_args(argv)
+
+
+def build_output(result):
+    """Extract only music_recommendations (and any error) from the agent's final state."""
+    # music_recommendations is None when the graph ended early
+    output = {
+        "music_recommendations": result.get("music_recommendations") or {"recommendations": []}
     }
-    print(json.dumps(error_result))
-    sys.exit(1)
+    
+    if "error" in result:
+        output["error"] = result["error"]
+    
+    return output
+
+
+def _read_stdin_in_background():
+    """Start reading all of stdin on a daemon thread and return a function that waits for the bytes.
+
+    The blocking read releases the GIL, so a caller that has to import the agent
+    anyway can do so while the input is still arriving. The thread is a daemon
+    so an early exit (e.g. a failed import) never waits on an open stdin; it
+    reads the file descriptor directly because a daemon thread blocked inside
+    sys.stdin.buffer would hold its lock during interpreter shutdown.
+    """
+    import threading
+    
+    chunks = []
+    
+    def read():
+        fd = sys.stdin.fileno()
+        while True:
+            chunk = os.read(fd, 1 << 20)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    
+    thread = threading.Thread(target=read, daemon=True)
+    thread.start()
+    
+    def result():
+        thread.join()
+        return b"".join(chunks)
+    
+    return result
+
+
+def emit_partial(music_recommendations):
+    """Write one partial music_recommendations JSON line to stdout."""
+    _emit({"partial": True, "music_recommendations": music_recommendations})
+
+
+def serve(args):
+    """Answer newline-delimited JSON jobs from stdin until EOF.
+
+    The agent is imported once and every job runs on the same event loop, so
+    the import cost and the Spotify connection pool are shared by all jobs.
+    Each job gets exactly one response line carrying its ``id``; a failing job
+    reports its error on that line instead of stopping the worker.
+    """
+    import asyncio
+    
+    agent = setup_agent(args)
+    if agent is None:
+        return 1
+    loop = asyncio.new_event_loop()
+    try:
+        for line in sys.stdin.buffer:
+            if not line.strip():
+                continue
+            job_id = None
+            try:
+                job = _loads(line)
+                job_id = job.get("id")
+                content = (job.get("content") or "").strip()
+                if not content:
+                    _write(_err("No content provided", id=job_id))
+                    continue
+                result = loop.run_until_complete(
+                    agent.arun_music_agent(content, use_cache=not args.no_cache)
+                )
+            except Exception as e:
+                _write(_err(str(e), error_type=type(e).__name__, id=job_id, **_traceback_fields()))
+                continue
+            _emit({"id": job_id, **build_output(result)})
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        loop.run_until_complete(agent.close_spotify_client())
+        loop.close()
+
+
+def run_batch(args):
+    """Answer a JSON array of contents on stdin with a JSON array of outputs, in input order.
+
+    Items run concurrently (at most ``--max-concurrency`` at a time) on one event
+    loop, so the import cost is paid once and the LLM round-trips overlap. A
+    failing item gets an error envelope in its slot instead of failing the batch.
+    """
+    import asyncio
+    
+    # Every batch needs the agent, so import it (and LangChain) while stdin is read
+    read_stdin = _read_stdin_in_background()
+    agent = setup_agent(args)
+    if agent is None:
+        return 1
+    agent.warm_up()
+    try:
+        inputs = _loads(read_stdin())
+    except ValueError as e:
+        _write(_err(f"Invalid batch input: {e}"))
+        return 1
+    if not isinstance(inputs, list):
+        _write(_err("Batch input must be a JSON array of strings"))
+        return 1
+    
+    async def run_one(content, semaphore):
+        content = content.strip() if isinstance(content, str) else ""
+        if not content:
+            return _err("No content provided")
+        async with semaphore:
+            try:
+                result = await agent.arun_music_agent(content, use_cache=not args.no_cache)
+            except Exception as e:
+                return _err(str(e), error_type=type(e).__name__, **_traceback_fields())
+        return _dumps(build_output(result), False)
+    
+    async def run_all():
+        semaphore = asyncio.Semaphore(max(1, args.max_concurrency))
+        try:
+            return await asyncio.gather(*(run_one(content, semaphore) for content in inputs))
+        finally:
+            await agent.close_spotify_client()
+    
+    try:
+        outputs = asyncio.run(run_all())
+    except KeyboardInterrupt:
+        _write(_err("Process interrupted by user"))
+        return 130
+    if args.pretty:
+        _emit([_loads(output) for output in outputs], indent=True)
+    else:
+        _write(b"[" + b",".join(outputs) + b"]")
+
 
 def main():
     """Main entry point for CLI."""
+    args = parse_args()
+    
+    # ai_agent imports urllib3 and LangChain on first use, so their known
+    # import-time warnings are filtered for the whole run; other warnings still
+    # reach stderr
+    with warnings.catch_warnings():
+        # Suppress urllib3 OpenSSL warnings (compatibility issue with LibreSSL)
+        warnings.filterwarnings("ignore", category=UserWarning, module="urllib3")
+        # Suppress LangChain pydantic deprecation warnings (langchain-core internal usage)
+        warnings.filterwarnings("ignore", message=".*langchain_core.pydantic_v1.*", category=DeprecationWarning)
+        return run(args)
+
+
+def run(args):
+    """Run the CLI for the parsed ``args`` and return the exit code (None on success)."""
+    if args.serve:
+        return serve(args)
+    if args.batch:
+        return run_batch(args)
+    
     # Read content from stdin or command line argument
-    if len(sys.argv) > 1:
+    agent = None
+    if args.content is not None:
         # Content passed as command line argument
-        content = sys.argv[1]
+        content = args.content.strip()
+    elif args.no_cache:
+        # Without the cache the agent import is unavoidable, so overlap it
+        # (and LangChain's, which ai_agent defers) with reading stdin
+        read_stdin = _read_stdin_in_background()
+        agent = setup_agent(args)
+        if agent is None:
+            return 1
+        agent.warm_up()
+        content = read_stdin().decode("utf-8", errors="replace").strip()
     else:
-        # Read from stdin
-        content = sys.stdin.read()
+        # Read raw bytes and decode once, skipping the text layer's locale
+        # decoding and newline translation
+        content = sys.stdin.buffer.read().decode("utf-8", errors="replace").strip()
+    
+    if not content:
+        _write(_err("No content provided"))
+        return 1
     
-    if not content or not content.strip():
-        error_result = {
-            "error": "No content provided",
-            "music_recommendations": {"recommendations": []}
-        }
-        print(json.dumps(error_result))
-        sys.exit(1)
+    # A cache hit is answered without importing the agent or LangChain at all
+    if not args.no_cache:
+        try:
+            from agent_cache import load_cached_state
+        except ImportError:
+            # Missing dependency; import_agent() below reports it
+            load_cached_state = None
+        cached_state = load_cached_state(content) if load_cached_state else None
+        if cached_state is not None:
+            print("Loaded result from cache", file=sys.stderr)
+            _emit(build_output(cached_state), indent=args.pretty)
+            return
+    
+    if agent is None:
+        agent = setup_agent(args)
+        if agent is None:
+            return 1
     
     # Run the agent
     try:
-        result = run_music_agent(content.strip())
-        
-        # Extract only music_recommendations for the response
-        # If there's an error, include it
-        output = {
-            "music_recommendations": result.get("music_recommendations", {"recommendations": []})
-        }
-        
-        if "error" in result:
-            output["error"] = result["error"]
+        result = agent.run_music_agent(
+            content,
+            on_partial=emit_partial if args.stream else None,
+            use_cache=not args.no_cache
+        )
         
         # Output as JSON
-        print(json.dumps(output, indent=2))
-        sys.exit(0)  # Explicit success exit
+        _emit(build_output(result), indent=args.pretty)
         
     except KeyboardInterrupt:
-        error_result = {
-            "error": "Process interrupted by user",
-            "music_recommendations": {"recommendations": []}
-        }
-        print(json.dumps(error_result))
-        sys.exit(130)  # Standard exit code for SIGINT
+        _write(_err("Process interrupted by user"))
+        return 130  # Standard exit code for SIGINT
     except Exception as e:
-        error_result = {
-            "error": str(e),
-            "error_type": type(e).__name__,
-            "music_recommendations": {"recommendations": []},
-            "traceback": traceback.format_exc()
-        }
-        print(json.dumps(error_result))
-        sys.exit(1)
+        _write(_err(str(e), error_type=type(e).__name__, **_traceback_fields()))
+        return 1
+
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main() or 0)